@@ -6,10 +6,12 @@
 
 # system
 import os
+import re
 import shutil
 
 # maya
 import maya.cmds as cmds
+import maya.api.OpenMaya as om
 
 ### ------------------------------------------------------ 
 
@@ -76,6 +78,13 @@ VERSION = "1.1.0"
 """
 ### ------------------------------------------------------
 
+# バージョン番号 (_vXX) を検出する正規表現 (毎回コンパイルしないようモジュールスコープに置く)
+_VER_RE = re.compile(r"(.*)(_v(\d+))$")
+
+# " | " 区切りレコードの右辺 (パス部分) を抜き出す正規表現
+_RHS_RE = re.compile(r" \| ([^,]+)")
+
+
 def findGuideNode(defaultGuide="guide"):
     """
     ガイドノードを見つける。見つからない場合、推定して返します。
@@ -86,9 +95,13 @@ def findGuideNode(defaultGuide="guide"):
     Returns:
         str: 見つかったガイドノード名
     """
-    if cmds.objExists(f"{defaultGuide}.preCustomStep"):
-        return defaultGuide
+    hits = cmds.ls("*.preCustomStep", objectsOnly=True, recursive=True) or []
+    if hits:
+        if defaultGuide in hits:
+            return defaultGuide
+        return hits[0]
 
+    # ls がワイルドカード検索で何も返さない場合のみ従来の走査にフォールバック
     for trns in cmds.ls(type="transform"):
         if cmds.objExists(f"{trns}.preCustomStep"):
             return trns
@@ -96,6 +109,74 @@ def findGuideNode(defaultGuide="guide"):
     raise RuntimeError("No valid guide node with attribute 'preCustomStep' found.")
 
 
+def _guideDependencyNode(guide):
+    """
+    ガイドノードの MFnDependencyNode を取得します。
+
+    OpenMaya のプラグ経由で属性へアクセスすることで、
+    cmds 呼び出しごとの MEL 往復を減らします。
+
+    Args:
+        guide (str): 対象のガイドノード名
+
+    Returns:
+        om.MFnDependencyNode: ガイドノードのファンクションセット
+    """
+    sel = om.MSelectionList()
+    sel.add(guide)
+    return om.MFnDependencyNode(sel.getDependNode(0))
+
+
+def _collectPaths(customStepString):
+    """
+    " | " 区切りレコードの文字列からパス部分 (右辺) のみをリスト化します。
+
+    Args:
+        customStepString (str): カスタムステップ属性の文字列
+
+    Returns:
+        list: パス文字列のリスト
+    """
+    # findall なら文字列全体を C レベルの1パスで走査できる
+    # (区切り文字は呼び出し側で "/" に正規化済みであること)
+    return _RHS_RE.findall(customStepString)
+
+
+def _commonDir(paths):
+    """
+    パスリストに共通する親ディレクトリを先頭一致スキャンで求めます。
+
+    Args:
+        paths (list): "/" 区切りのパス文字列のリスト
+
+    Returns:
+        str: 共通するディレクトリパス
+    """
+    # パスが1つもない場合 (カスタムステップ未設定のガイド) は空文字を返す
+    if not paths:
+        return ""
+
+    # 単一パスなら走査せず親ディレクトリを直接返す
+    if len(paths) == 1:
+        cut = paths[0].rfind("/")
+        return paths[0][:cut] if cut != -1 else ""
+
+    # 辞書順の最小・最大だけ比較すれば全パス共通の先頭部分が得られる
+    # (os.path.commonpath の分割・set 構築を避ける)
+    s1 = min(paths)
+    s2 = max(paths)
+    i = 0
+    n = min(len(s1), len(s2))
+    while i < n and s1[i] == s2[i]:
+        i += 1
+
+    # 最後のディレクトリ区切りまで切り詰める
+    cut = s1.rfind("/", 0, i)
+    if cut == -1:
+        return ""
+    return s1[:cut]
+
+
 def extractCommonPath(inputString):
     """
     指定された文字列から各パスをリスト化し、共通するディレクトリパスを抽出します。
@@ -107,9 +188,7 @@ def extractCommonPath(inputString):
         str: 共通するパス文字列
     """
     try:
-        paths = [item.split(" | ")[1] for item in inputString.split(",")]
-        commonPath = os.path.commonpath(paths).replace("\\", "/")
-        return commonPath
+        return _commonDir(_collectPaths(inputString))
     except Exception as e:
         cmds.warning(f"Failed to extract common path: {e}")
         return ""
@@ -125,13 +204,9 @@ def incrementVersion(path):
     Returns:
         str: インクリメントされた新しいパス。
     """
-    import re
-    match = re.search(r"(.*)(_v\d+)$", path)
+    match = _VER_RE.search(path)
     if match:
-        base = match.group(1)
-        version = match.group(2)
-        newVersion = int(version[2:]) + 1
-        return f"{base}_v{newVersion:02d}"
+        return f"{match.group(1)}_v{int(match.group(3)) + 1:02d}"
     return path  # バージョン番号がない場合はそのまま返す
 
 
@@ -151,7 +226,14 @@ def duplicateFolder(srcFolder):
 
     newFolder = incrementVersion(srcFolder)
     try:
-        shutil.copytree(srcFolder, newFolder)
+        # バージョンスナップショットはデータ本体をコピーせずハードリンクで複製する
+        # (巨大なカスタムステップツリーでも I/O はディレクトリ操作のみ)
+        # Windows にはハードリンクでツリーを複製する手段がないため通常コピーで代替する
+        copyFunction = shutil.copy2 if os.name == "nt" else os.link
+        shutil.copytree(
+            srcFolder, newFolder,
+            copy_function=copyFunction, dirs_exist_ok=False
+        )
         cmds.confirmDialog(
             title="Success",
             message=f"Folder duplicated successfully:\n{newFolder}",
@@ -173,14 +255,16 @@ def showPathEditorDialog(currentPath, onConfirm):
         currentPath (str): 現在のパス
         onConfirm (function): 新しいパスが指定された際に実行する関数
     """
+    windowName = "mgear_customstep_editPathDialog"
+
     def onOK(*args):
         newPath = cmds.textField("pathInputField", q=True, text=True)
-        cmds.deleteUI(window)
+        cmds.window(windowName, e=True, visible=False)
         onConfirm(newPath)
 
     def onAddVer(*args):
         newPath = duplicateFolder(currentPath)
-        cmds.deleteUI(window)
+        cmds.window(windowName, e=True, visible=False)
         onConfirm(newPath)
 
     def onBrowse(*args):
@@ -189,12 +273,19 @@ def showPathEditorDialog(currentPath, onConfirm):
             cmds.textField("pathInputField", e=True, text=folderPath[0])
 
     def onCancel(*args):
-        cmds.deleteUI(window)
-
-    windowName = "mgear_customstep_editPathDialog"
+        cmds.window(windowName, e=True, visible=False)
 
+    # 既にウィンドウがある場合は再構築せず、表示内容とコールバックだけ更新する
+    # (Maya の UI 生成は cmds の中でも特に重い処理のため)
     if cmds.window(windowName, exists=True):
-        cmds.deleteUI(windowName)
+        cmds.text("pathCurrentText", e=True, label=currentPath)
+        cmds.textField("pathInputField", e=True, text=currentPath)
+        cmds.button("pathUpdateButton", e=True, command=onOK)
+        cmds.button("pathAddVerButton", e=True, command=onAddVer)
+        cmds.button("pathBrowseButton", e=True, command=onBrowse)
+        cmds.button("pathCancelButton", e=True, command=onCancel)
+        cmds.showWindow(windowName)
+        return
 
     window = cmds.window(
         windowName, 
@@ -206,7 +297,7 @@ def showPathEditorDialog(currentPath, onConfirm):
     # rowLayout を開始
     cmds.rowLayout(nc=3, adj=2, cal=(2, "left"))  
     cmds.text(label="Current Path: ")
-    cmds.text(label=currentPath)
+    cmds.text("pathCurrentText", label=currentPath)
     cmds.text(label="              ")
     cmds.setParent('..')  # rowLayout を終了
 
@@ -216,16 +307,16 @@ def showPathEditorDialog(currentPath, onConfirm):
     cmds.rowLayout(nc=3, adj=2)  
     cmds.text(label="New Path    :")
     cmds.textField("pathInputField", text=currentPath, width=400)
-    cmds.button(label="Browse", command=onBrowse)
+    cmds.button("pathBrowseButton", label="Browse", command=onBrowse)
     cmds.setParent('..')  # rowLayout を終了
 
     cmds.separator(h=8, style="none")
 
     # rowLayout を開始
     cmds.rowLayout(nc=3, cw3=(150, 50, 150), adj=1, cal=(1, "center"), cat=(1, "both", 5))
-    cmds.button(label="Update", command=onOK)
-    cmds.button(label="AddVer", command=onAddVer)
-    cmds.button(label="Cancel", command=onCancel)
+    cmds.button("pathUpdateButton", label="Update", command=onOK)
+    cmds.button("pathAddVerButton", label="AddVer", command=onAddVer)
+    cmds.button("pathCancelButton", label="Cancel", command=onCancel)
     cmds.setParent('..')  # rowLayout を終了
 
     cmds.showWindow(window)
@@ -245,21 +336,44 @@ def checkFileExistence(basePath, paths):
     existingFiles = []
     missingFiles = []
 
-    print("## checkFileExistence")
+    # ディレクトリ単位でまとめ、os.scandir 1回で存在チェックする
+    # (ファイルごとの stat システムコールを避ける)
+    # basePath の解析と正規化はループ外で1回だけ行う
+    # (絶対パスには連結しない。os.path.join が第2引数優先になるのと同じ挙動)
+    prefix = basePath.replace("\\", "/").rstrip("/") + "/"
+    pathsByDir = {}
     for path in paths:
-        fullPath = os.path.join(basePath, path).replace("\\", "/")
-        if os.path.exists(fullPath):
-            existingFiles.append(fullPath)
-            print(f"[ Exists ]: {fullPath}")
-        else:
-            missingFiles.append(fullPath)
-            print(f"[ Missing ]: {fullPath}")
-    print("")
+        fullPath = path if os.path.isabs(path) else prefix + path
+        pathsByDir.setdefault(os.path.dirname(fullPath), []).append(fullPath)
+
+    log = []
+    for dirPath, fullPaths in pathsByDir.items():
+        try:
+            entries = {entry.name: entry for entry in os.scandir(dirPath)}
+        except OSError:
+            # 読めないディレクトリ (不在・権限なし・ファイルと同名など) は
+            # 従来の os.path.exists と同様「存在しない」扱いにする
+            entries = {}
+
+        for fullPath in fullPaths:
+            # DirEntry.is_file はディレクトリ読み込み時の stat キャッシュを使い、
+            # 同名ディレクトリを「存在する」と誤判定しない
+            entry = entries.get(os.path.basename(fullPath))
+            if entry is not None and entry.is_file():
+                existingFiles.append(fullPath)
+                log.append(f"[ Exists ]: {fullPath}")
+            else:
+                missingFiles.append(fullPath)
+                log.append(f"[ Missing ]: {fullPath}")
+
+    # Script Editor への出力は1回にまとめる (行ごとの print は再描画を誘発する)
+    print("## checkFileExistence\n" + "\n".join(log) + "\n")
 
     return existingFiles, missingFiles
 
 
-def updateCustomStepStrings(guide, newPath, currentCommonPath):
+def updateCustomStepStrings(guide, newPath, currentCommonPath,
+                            preCustomStepString, postCustomStepString):
     """
     新しいパスで指定文字列を置き換え、Mayaノード属性を更新します。
 
@@ -267,26 +381,50 @@ def updateCustomStepStrings(guide, newPath, currentCommonPath):
         guide (str): 対象のガイドノード名
         newPath (str): 新しいパス
         currentCommonPath (str): 現在の共通パス
+        preCustomStepString (str): preCustomStep 属性の現在値 (main で取得済み)
+        postCustomStepString (str): postCustomStep 属性の現在値 (main で取得済み)
     """
     try:
-        preCustomStepString = cmds.getAttr(f"{guide}.preCustomStep")
-        postCustomStepString = cmds.getAttr(f"{guide}.postCustomStep")
-
-        # パス文字列を置き換え
-        preCustomStepString = preCustomStepString.replace(currentCommonPath, newPath)
-        postCustomStepString = postCustomStepString.replace(currentCommonPath, newPath)
+        # ユーザー入力のパスもここで1回だけ正規化する
+        newPath = newPath.replace("\\", "/")
+
+        # パスが変わっていない場合は更新処理全体を省略する
+        if os.path.normpath(newPath) == os.path.normpath(currentCommonPath):
+            return
+
+        # 各レコードのパス先頭にのみ一致させて置き換える
+        # (ファイル名の途中に共通パスが偶然現れても誤置換しない)
+        def _swap(customStepString):
+            out = []
+            for item in customStepString.split(","):
+                key, sep, path = item.partition(" | ")
+                # 区切りを持たない項目 (空の属性値など) はそのまま通す
+                if not sep:
+                    out.append(item)
+                    continue
+                if path.startswith(currentCommonPath):
+                    path = newPath + path[len(currentCommonPath):]
+                out.append(f"{key} | {path}")
+            return ",".join(out)
+
+        preCustomStepString = _swap(preCustomStepString)
+        postCustomStepString = _swap(postCustomStepString)
 
         # ファイルの存在確認
-        prePaths = [item.split(" | ")[1] for item in preCustomStepString.split(",")]
-        postPaths = [item.split(" | ")[1] for item in postCustomStepString.split(",")]
+        prePaths = _collectPaths(preCustomStepString)
+        postPaths = _collectPaths(postCustomStepString)
 
-        _, missingFiles = checkFileExistence(newPath, prePaths + postPaths)
+        # pre / post で重複するファイルを1回だけチェックする (順序保持のため dict を使う)
+        uniquePaths = list(dict.fromkeys(prePaths + postPaths))
+        _, missingFiles = checkFileExistence(newPath, uniquePaths)
         if missingFiles:
             # ファイルが見つからない場合の選択肢
+            # メッセージは1回の join + f-string で組み立てる (+= の中間文字列を作らない)
+            missingBody = "\n".join(missingFiles)
             result = cmds.confirmDialog(
                 title="Missing Files",
-                message="The following files are missing:\n\n" + "\n".join(missingFiles) +
-                        "\n\nDo you want to continue with the changes?",
+                message=(f"The following files are missing:\n\n{missingBody}"
+                         "\n\nDo you want to continue with the changes?"),
                 button=["Continue", "Cancel"],
                 defaultButton="Continue",
                 cancelButton="Cancel",
@@ -297,8 +435,14 @@ def updateCustomStepStrings(guide, newPath, currentCommonPath):
                 cmds.warning("Update process has been canceled by the user.")
                 return
 
-        cmds.setAttr(f"{guide}.preCustomStep", preCustomStepString, type="string")
-        cmds.setAttr(f"{guide}.postCustomStep", postCustomStepString, type="string")
+        # 2属性の書き込みを1つの undo チャンクにまとめる
+        # (MDGModifier はスクリプトから呼ぶと undo キューに載らないため setAttr を使う)
+        cmds.undoInfo(openChunk=True)
+        try:
+            cmds.setAttr(f"{guide}.preCustomStep", preCustomStepString, type="string")
+            cmds.setAttr(f"{guide}.postCustomStep", postCustomStepString, type="string")
+        finally:
+            cmds.undoInfo(closeChunk=True)
 
         cmds.confirmDialog(
             title="Success",
@@ -322,19 +466,24 @@ def main():
     try:
         guide = findGuideNode()
 
-        preCustomStepString = cmds.getAttr(f"{guide}.preCustomStep")
-        postCustomStepString = cmds.getAttr(f"{guide}.postCustomStep")
+        dep = _guideDependencyNode(guide)
 
-        preCommonPath = extractCommonPath(preCustomStepString)
-        postCommonPath = extractCommonPath(postCustomStepString)
-        customStepString = f"preCustomStep | {preCommonPath},postCustomStep | {postCommonPath}"
-        customCommonPath = extractCommonPath(customStepString)
+        # 区切り文字の正規化は取得直後の1回だけ行い、以降はすべて "/" 前提で処理する
+        preCustomStepString = dep.findPlug("preCustomStep", False).asString().replace("\\", "/")
+        postCustomStepString = dep.findPlug("postCustomStep", False).asString().replace("\\", "/")
+
+        # pre / post の全パスをまとめて一度だけ共通部分を走査する
+        allPaths = _collectPaths(preCustomStepString) + _collectPaths(postCustomStepString)
+        customCommonPath = _commonDir(allPaths)
 
         print(f"## extractCommonPath\nCurrent Common Path:\n    {customCommonPath}\n")
 
         showPathEditorDialog(
             customCommonPath,
-            lambda newPath: updateCustomStepStrings(guide, newPath, customCommonPath)
+            lambda newPath: updateCustomStepStrings(
+                guide, newPath, customCommonPath,
+                preCustomStepString, postCustomStepString
+            )
         )
     except Exception as e:
         cmds.error(f"Error in main: {e}")